@@ -15,6 +15,7 @@
 
 from __future__ import absolute_import
 
+import collections
 import os
 import subprocess
 import sys
@@ -36,9 +37,163 @@ def protoc_import_path_option(incs):
     return ' '.join(['-I=%s' % inc for inc in incs])
 
 
+# Shells which are known whether support the `pipefail` option or not
+_PIPEFAIL_SHELLS = ('bash', 'ksh', 'mksh', 'zsh')
+_NO_PIPEFAIL_SHELLS = ('dash',)
+
+_shell_pipefail_supported = None
+
+
 def _shell_support_pipefail():
     """Whether current shell support the `pipefail` option"""
-    return subprocess.call('set -o pipefail 2>/dev/null', shell=True) == 0
+    global _shell_pipefail_supported
+    if _shell_pipefail_supported is None:
+        # Recognize the shell by its real name to avoid forking a process, probe it only if unknown
+        shell = os.path.basename(os.path.realpath('/bin/sh'))
+        if shell in _PIPEFAIL_SHELLS:
+            _shell_pipefail_supported = True
+        elif shell in _NO_PIPEFAIL_SHELLS:
+            _shell_pipefail_supported = False
+        else:
+            _shell_pipefail_supported = subprocess.call('set -o pipefail 2>/dev/null', shell=True) == 0
+    return _shell_pipefail_supported
+
+
+_cc_flags_cache = {}
+
+
+def _cc_flags_for(profile, m, gprof, coverage, debug_info_options):
+    """Get the common c/c++ flags for the given build options.
+
+    The result only depends on the arguments, so it is cached.
+
+    Returns:
+        A (cppflags, linkflags) pair of tuples.
+    """
+    key = (profile, m, gprof, coverage, debug_info_options)
+    if key in _cc_flags_cache:
+        return _cc_flags_cache[key]
+
+    cppflags = []
+    linkflags = []
+    if m:
+        cppflags = ['-m%s' % m]
+        linkflags = ['-m%s' % m]
+    # Add -fno-omit-frame-pointer to optimize mode for easy debugging.
+    cppflags += ['-pipe', '-fno-omit-frame-pointer']
+
+    # Debugging information setting
+    cppflags += debug_info_options
+
+    # Option debugging flags
+    if profile == 'debug':
+        cppflags.append('-fstack-protector')
+    elif profile == 'release':
+        cppflags.append('-DNDEBUG')
+
+    cppflags += [
+        '-D_FILE_OFFSET_BITS=64',
+        '-D__STDC_CONSTANT_MACROS',
+        '-D__STDC_FORMAT_MACROS',
+        '-D__STDC_LIMIT_MACROS',
+    ]
+
+    if gprof:
+        cppflags.append('-pg')
+        linkflags.append('-pg')
+
+    if coverage:
+        cppflags.append('--coverage')
+        linkflags.append('--coverage')
+
+    result = tuple(cppflags), tuple(linkflags)
+    _cc_flags_cache[key] = result
+    return result
+
+
+def _find_executable(name):
+    """Find the full path of an executable in PATH, return None if not found"""
+    for path in os.environ.get('PATH', '').split(os.pathsep):
+        exe = os.path.join(path, name)
+        if os.path.isfile(exe) and os.access(exe, os.X_OK):
+            return exe
+    return None
+
+
+# The awk script to split the inclusion stack from the diagnostic messages.
+# NOTE the `$$` is required by ninja. and the useless `Multiple ...` is the last part of
+# the messages.
+_SPLIT_GCC_H_AWK_SCRIPT = ("""'BEGIN {stop=0} /^Multiple include guards may be useful for:/ {stop=1}"""
+                           """ !stop {if ($$1 ~/^\.+$$/) print $$0; else print $$0 > "/dev/stderr"}'""")
+
+# The (prefix, suffix) to wrap the compile command to generate the header inclusion stack file,
+# the `%s` in suffix is the command to split it from the diagnostic messages.
+# Use `pipefail` to ensure that the exit code is correct.
+_INCLUSION_CHECK_PIPEFAIL_WRAPPER = ('export LC_ALL=C; set -o pipefail; ', ' -H 2>&1 | %s > ${out}.H')
+# Some shell such as Ubuntu's `dash` doesn't support pipefail, make a workaround.
+_INCLUSION_CHECK_NO_PIPEFAIL_WRAPPER = (
+    'export LC_ALL=C; ',
+    ' -H 2> ${out}.err; ec=$$?; %s < ${out}.err > ${out}.H ; rm -f ${out}.err; exit $$ec')
+
+
+# Fixed parts of the build script, with placeholders for the variable parts
+_NINJA_HEADER_TPL = textwrap.dedent('''\
+    # build.ninja generated by blade
+    ninja_required_version = 1.7
+    builddir = %s
+    ''')
+
+_HEAVY_POOL_TPL = textwrap.dedent('''\
+    pool heavy_pool
+      depth = 1
+    ''')
+
+_CC_VARS_TPL = textwrap.dedent('''\
+    c_warnings = %s
+    cxx_warnings = %s
+    optimize_flags = %s
+    optimize = %s
+    ''')
+
+_LINK_POOL_TPL = textwrap.dedent('''\
+    pool %s
+      depth = %s''')
+
+_PROTO_FLAGS_TPL = textwrap.dedent('''\
+    protocflags =
+    protoccpppluginflags =
+    protocjavapluginflags =
+    protocpythonpluginflags =
+    ''')
+
+_JAVAC_DEFAULTS_TPL = textwrap.dedent('''\
+    source_encoding = UTF-8
+    classpath = .
+    javacflags =
+    ''')
+
+_SCALAC_DEFAULTS_TPL = textwrap.dedent('''\
+    scalacflags = -nowarn
+    ''')
+
+_GO_POOL_TPL = textwrap.dedent('''\
+    pool %s
+      depth = 1
+    ''')
+
+_SCM_BUILD_TPL = textwrap.dedent('''\
+    build %s: scm
+      revision = %s
+      url = %s
+      profile = %s
+      compiler = %s
+    ''')
+
+_SCM_CXX_TPL = textwrap.dedent('''\
+    build %s: cxx %s
+      cppflags = -w -O2
+      cxx_warnings =
+    ''')
 
 
 class _NinjaFileHeaderGenerator(object):
@@ -49,20 +204,62 @@ class _NinjaFileHeaderGenerator(object):
     for the underlying build system.
     """
     # pylint: disable=too-many-public-methods
+
+    # Rules which simply run a builtin tool: (name, builder, description, suffix)
+    _BUILTIN_RULES = (
+        ('resource_index', 'resource_index', 'RESOURCE INDEX ${out}', '${name} ${path} ${out} ${in}'),
+        ('javaresource', 'java_resource', 'JAVA RESOURCE ${in}', ''),
+        ('fatjar', 'java_fatjar', 'FAT JAR ${out}', ''),
+        ('javabinary', 'java_binary', 'JAVA BIN ${out}', ''),
+        ('pythonlibrary', 'python_library', 'PYTHON LIBRARY ${out}',
+         '--basedir=${basedir} --pylib=${out} ${in}'),
+        ('pythonbinary', 'python_binary', 'PYTHON BINARY ${out}',
+         '--basedir=${basedir} --exclusions=${exclusions} --mainentry=${mainentry} --pybin=${out} ${in}'),
+        ('shelltest', 'shell_test', 'SHELL TEST ${out}', ''),
+        ('shelltestdata', 'shell_testdata', 'SHELL TEST DATA ${out}', '${out} ${in} ${testdata}'),
+        ('package', 'package', 'PACKAGE ${out}', '${out} ${in} ${entries}'),
+    )
+
     def __init__(self, options, build_dir, blade_path, build_toolchain, blade):
         self.options = options
         self.build_dir = build_dir
         self.blade_path = blade_path
         self.build_toolchain = build_toolchain
+        self._compiler = '%s %s' % (build_toolchain.get_cc(), build_toolchain.get_cc_version())
+
+        # Common parts of the command to run a builtin tool
+        self._builtin_env = 'PYTHONPATH=%s:$$PYTHONPATH' % blade_path
+        self._builtin_tool = '%s -m blade.builtin_tools' % sys.executable
+        self._builtin_prefix = '%s %s' % (self._builtin_env, self._builtin_tool)
+
+        # Paths and options derived from the build_dir
+        self._scm_path = os.path.join(build_dir, 'scm.cc')
+        self._cpp_out_arg = '--cpp_out=%s' % build_dir
+        self._java_out_prefix = '--java_out=%s' % build_dir
+        self._python_out_arg = '--python_out=%s' % build_dir
         self.build_accelerator = blade.build_accelerator
         self.blade = blade
 
-        self.rules_buf = []
-        self.__all_rule_names = set()
+        # Snapshot the config sections used by this generator, they are fixed once loaded
+        self._global_config = config.get_section('global_config')
+        self._cc_config = config.get_section('cc_config')
+        self._cc_library_config = config.get_section('cc_library_config')
+        self._proto_config = config.get_section('proto_library_config')
+        self._java_config = config.get_section('java_config')
+        self._java_binary_config = config.get_section('java_binary_config')
+        self._java_test_config = config.get_section('java_test_config')
+        self._scala_config = config.get_section('scala_config')
+        self._go_config = config.get_section('go_config')
+        self._thrift_config = config.get_section('thrift_config')
+        self._link_config_link_jobs = config.get_item('link_config', 'link_jobs')
+
+        self._write = None  # Set by `generate`
+        self.__all_rule_names = collections.OrderedDict()  # Used as an ordered set
 
     def _add_rule(self, rule):
-        """Append one rule to buffer. """
-        self.rules_buf.append('%s\n' % rule)
+        """Write one rule to the output. """
+        self._write(rule)
+        self._write('\n')
 
     def get_all_rule_names(self):
         return list(self.__all_rule_names)
@@ -71,38 +268,27 @@ class _NinjaFileHeaderGenerator(object):
                       depfile=None, generator=False, pool=None,
                       restat=False, rspfile=None,
                       rspfile_content=None, deps=None):
-        self.__all_rule_names.add(name)
-        self._add_rule('rule %s' % name)
-        self._add_rule('  command = %s' % command)
+        self.__all_rule_names[name] = None
+        rule = ['rule %s' % name, '  command = %s' % command]
         if description:
-            self._add_rule('  description = %s' % console.colored(description, 'dimpurple'))
-        if depfile:
-            self._add_rule('  depfile = %s' % depfile)
-        if generator:
-            self._add_rule('  generator = 1')
-        if pool:
-            self._add_rule('  pool = %s' % pool)
-        if restat:
-            self._add_rule('  restat = 1')
-        if rspfile:
-            self._add_rule('  rspfile = %s' % rspfile)
-        if rspfile_content:
-            self._add_rule('  rspfile_content = %s' % rspfile_content)
-        if deps:
-            self._add_rule('  deps = %s' % deps)
-        self._add_rule('')  # An empty line to improve readability
+            description = console.colored(description, 'dimpurple')
+        for key, value in (('description', description),
+                           ('depfile', depfile),
+                           ('generator', generator and 1),
+                           ('pool', pool),
+                           ('restat', restat and 1),
+                           ('rspfile', rspfile),
+                           ('rspfile_content', rspfile_content),
+                           ('deps', deps)):
+            if value:
+                rule.append('  %s = %s' % (key, value))
+        rule.append('')  # An empty line to improve readability
+        self._add_rule('\n'.join(rule))
 
     def generate_file_header(self):
-        self._add_rule(textwrap.dedent('''\
-                # build.ninja generated by blade
-                ninja_required_version = 1.7
-                builddir = %s
-                ''') % self.build_dir)
+        self._add_rule(_NINJA_HEADER_TPL % self.build_dir)
         # No more than 1 heavy target at a time
-        self._add_rule(textwrap.dedent('''\
-                pool heavy_pool
-                  depth = 1
-                '''))
+        self._add_rule(_HEAVY_POOL_TPL)
 
     def generate_common_rules(self):
         self.generate_rule(name='copy',
@@ -111,56 +297,26 @@ class _NinjaFileHeaderGenerator(object):
 
     def _get_cc_flags(self):
         """Get the common c/c++ flags."""
-        global_config = config.get_section('global_config')
-        cc_config = config.get_section('cc_config')
-
-        cppflags = []
-        linkflags = []
-        if self.options.m:
-            cppflags = ['-m%s' % self.options.m]
-            linkflags = ['-m%s' % self.options.m]
-        # Add -fno-omit-frame-pointer to optimize mode for easy debugging.
-        cppflags += ['-pipe', '-fno-omit-frame-pointer']
-
-        # Debugging information setting
-        debug_info_level = global_config['debug_info_level']
-        debug_info_options = cc_config['debug_info_levels'][debug_info_level]
-        cppflags += debug_info_options
-
-        # Option debugging flags
-        if self.options.profile == 'debug':
-            cppflags.append('-fstack-protector')
-        elif self.options.profile == 'release':
-            cppflags.append('-DNDEBUG')
-
-        cppflags += [
-            '-D_FILE_OFFSET_BITS=64',
-            '-D__STDC_CONSTANT_MACROS',
-            '-D__STDC_FORMAT_MACROS',
-            '-D__STDC_LIMIT_MACROS',
-        ]
-
-        if getattr(self.options, 'gprof', False):
-            cppflags.append('-pg')
-            linkflags.append('-pg')
-
-        if getattr(self.options, 'coverage', False):
-            cppflags.append('--coverage')
-            linkflags.append('--coverage')
-
-        cppflags = self.build_toolchain.filter_cc_flags(cppflags)
-        return cppflags, linkflags
+        debug_info_level = self._global_config['debug_info_level']
+        debug_info_options = self._cc_config['debug_info_levels'][debug_info_level]
+        cppflags, linkflags = _cc_flags_for(self.options.profile,
+                                            self.options.m,
+                                            getattr(self.options, 'gprof', False),
+                                            getattr(self.options, 'coverage', False),
+                                            tuple(debug_info_options))
+        cppflags = self.build_toolchain.filter_cc_flags(list(cppflags))
+        return cppflags, list(linkflags)
 
     def _get_warning_flags(self):
         """Get the warning flags. """
-        cc_config = config.get_section('cc_config')
+        cc_config = self._cc_config
         cppflags = cc_config['warnings']
         cxxflags = cc_config['cxx_warnings']
         cflags = cc_config['c_warnings']
 
-        filtered_cppflags = self.build_toolchain.filter_cc_flags(cppflags)
-        filtered_cxxflags = self.build_toolchain.filter_cc_flags(cxxflags, 'c++')
-        filtered_cflags = self.build_toolchain.filter_cc_flags(cflags, 'c')
+        filtered_cppflags, filtered_cxxflags, filtered_cflags = \
+            self.build_toolchain.filter_cc_flags_batch([
+                (cppflags, 'c'), (cxxflags, 'c++'), (cflags, 'c')])
 
         return filtered_cppflags, filtered_cxxflags, filtered_cflags
 
@@ -169,15 +325,10 @@ class _NinjaFileHeaderGenerator(object):
         c_warnings += warnings
         cxx_warnings += warnings
         # optimize_flags is need for `always_optimize`
-        optimize_flags = config.get_item('cc_config', 'optimize')
+        optimize_flags = self._cc_config['optimize']
         optimize = '$optimize_flags' if self.options.profile == 'release' else ''
-        self._add_rule(textwrap.dedent('''\
-                c_warnings = %s
-                cxx_warnings = %s
-                optimize_flags = %s
-                optimize = %s
-                ''') % (' '.join(c_warnings), ' '.join(cxx_warnings),
-                        ' '.join(optimize_flags), optimize))
+        self._add_rule(_CC_VARS_TPL % (' '.join(c_warnings), ' '.join(cxx_warnings),
+                                       ' '.join(optimize_flags), optimize))
 
     def _hdrs_command(self, cc, flags, cppflags, includes):
         """Command to generate cc inclusion information file"""
@@ -193,8 +344,8 @@ class _NinjaFileHeaderGenerator(object):
     def generate_cc_rules(self):
         # pylint: disable=too-many-locals
         cc, cxx, ld = self.build_accelerator.get_cc_commands()
-        cc_config = config.get_section('cc_config')
-        cc_library_config = config.get_section('cc_library_config')
+        cc_config = self._cc_config
+        cc_library_config = self._cc_library_config
         cflags, cxxflags = cc_config['cflags'], cc_config['cxxflags']
         cppflags, ldflags = self._get_cc_flags()
         cppflags = cc_config['cppflags'] + cppflags
@@ -203,6 +354,10 @@ class _NinjaFileHeaderGenerator(object):
         includes = cc_config['extra_incs']
         includes = includes + ['.', self.build_dir]
         includes = ' '.join(['-I%s' % inc for inc in includes])
+        cflags = ' '.join(cflags)
+        cxxflags = ' '.join(cxxflags)
+        cppflags = ' '.join(cppflags)
+        ldflags = ' '.join(ldflags)
 
         self.generate_cc_vars()
 
@@ -210,35 +365,40 @@ class _NinjaFileHeaderGenerator(object):
         # we use the gcc's `-H` option to generate the inclusion stack information, see
         # https://gcc.gnu.org/onlinedocs/gcc/Preprocessor-Options.html for details.
         # But this information is output to stderr mixed with diagnostic messages.
-        # So we use this awk script to split them.
+        # So we use an awk script to split them, or the slower `split_gcc_h` builtin tool if
+        # awk is not installed.
         #
-        # NOTE the `$$` is required by ninja. and the useless `Multiple ...` is the last part of
-        # the messages.
-        awk_script = ("""'BEGIN {stop=0} /^Multiple include guards may be useful for:/ {stop=1}"""
-                      """ !stop {if ($$1 ~/^\.+$$/) print $$0; else print $$0 > "/dev/stderr"}'""")
-
-        if _shell_support_pipefail():
-            # Use `pipefail` to ensure that the exit code is correct.
-            template = 'export LC_ALL=C; set -o pipefail; %%s -H 2>&1 | awk %s > ${out}.H' % awk_script
+        # This check can be disabled by `cc_config.check_inclusion`, then only the depfile generated
+        # by `-MMD` is used to track the header dependencies.
+        if _find_executable('awk'):
+            split_command = 'awk %s' % _SPLIT_GCC_H_AWK_SCRIPT
         else:
-            # Some shell such as Ubuntu's `dash` doesn't support pipefail, make a workaround.
-            template = ('export LC_ALL=C; %%s -H 2> ${out}.err; ec=$$?; awk %s < ${out}.err > ${out}.H ; '
-                        'rm -f ${out}.err; exit $$ec') % awk_script
+            split_command = '%s split_gcc_h' % self._builtin_prefix
+
+        # The compile command is wrapped as `prefix + command + suffix`
+        if not cc_config['check_inclusion']:
+            prefix, suffix = '', ''
+        else:
+            if _shell_support_pipefail():
+                prefix, suffix = _INCLUSION_CHECK_PIPEFAIL_WRAPPER
+            else:
+                prefix, suffix = _INCLUSION_CHECK_NO_PIPEFAIL_WRAPPER
+            suffix = suffix % split_command
 
         cc_command = ('%s -o ${out} -MMD -MF ${out}.d -c -fPIC %s %s ${optimize} '
                       '${c_warnings} ${cppflags} %s ${includes} ${in}') % (
-                              cc, ' '.join(cflags), ' '.join(cppflags), includes)
+                              cc, cflags, cppflags, includes)
         self.generate_rule(name='cc',
-                           command=template % cc_command,
+                           command=prefix + cc_command + suffix,
                            description='CC ${in}',
                            depfile='${out}.d',
                            deps='gcc')
 
         cxx_command = ('%s -o ${out} -MMD -MF ${out}.d -c -fPIC %s %s ${optimize} '
                        '${cxx_warnings} ${cppflags} %s ${includes} ${in}') % (
-                               cxx, ' '.join(cxxflags), ' '.join(cppflags), includes)
+                               cxx, cxxflags, cppflags, includes)
         self.generate_rule(name='cxx',
-                           command=template % cxx_command,
+                           command=prefix + cxx_command + suffix,
                            description='CXX ${in}',
                            depfile='${out}.d',
                            deps='gcc')
@@ -247,7 +407,7 @@ class _NinjaFileHeaderGenerator(object):
         self.generate_rule(name='securecccompile',
                            command='%s -o ${out} -c -fPIC '
                                    '%s %s ${optimize} ${cxx_warnings} ${cppflags} %s ${includes} ${in}' % (
-                                       securecc, ' '.join(cxxflags), ' '.join(cppflags), includes),
+                                       securecc, cxxflags, cppflags, includes),
                            description='SECURECC ${in}')
         self.generate_rule(name='securecc',
                            command=self._builtin_command('securecc_object'),
@@ -257,24 +417,22 @@ class _NinjaFileHeaderGenerator(object):
         self.generate_rule(name='ar',
                            command='rm -f $out; ar %s $out $in' % arflags,
                            description='AR ${out}')
-        link_jobs = config.get_item('link_config', 'link_jobs')
+        link_jobs = self._link_config_link_jobs
         if link_jobs:
             link_jobs = min(link_jobs, self.blade.build_jobs_num())
             console.info('Adjust parallel link jobs number to %s' % link_jobs)
             pool = 'link_pool'
-            self._add_rule(textwrap.dedent('''\
-                    pool %s
-                      depth = %s''') % (pool, link_jobs))
+            self._add_rule(_LINK_POOL_TPL % (pool, link_jobs))
         else:
             pool = None
         self.generate_rule(name='link',
                            command='%s -o ${out} %s ${ldflags} ${in} ${extra_ldflags}' % (
-                               ld, ' '.join(ldflags)),
+                               ld, ldflags),
                            description='LINK ${out}',
                            pool=pool)
         self.generate_rule(name='solink',
                            command='%s -o ${out} -shared %s ${ldflags} ${in} ${extra_ldflags}' % (
-                               ld, ' '.join(ldflags)),
+                               ld, ldflags),
                            description='SHAREDLINK ${out}',
                            pool=pool)
         self.generate_rule(name='strip',
@@ -282,7 +440,7 @@ class _NinjaFileHeaderGenerator(object):
                            description='STRIP ${out}')
 
     def generate_proto_rules(self):
-        proto_config = config.get_section('proto_library_config')
+        proto_config = self._proto_config
         protoc = proto_config['protoc']
         protoc_java = protoc
         if proto_config['protoc_java']:
@@ -291,26 +449,21 @@ class _NinjaFileHeaderGenerator(object):
         protobuf_java_incs = protobuf_incs
         if proto_config['protobuf_java_incs']:
             protobuf_java_incs = protoc_import_path_option(proto_config['protobuf_java_incs'])
-        self._add_rule(textwrap.dedent('''\
-                protocflags =
-                protoccpppluginflags =
-                protocjavapluginflags =
-                protocpythonpluginflags =
-                '''))
+        self._add_rule(_PROTO_FLAGS_TPL)
         self.generate_rule(name='proto',
                            command='%s --proto_path=. %s -I=`dirname ${in}` '
-                                   '--cpp_out=%s ${protocflags} ${protoccpppluginflags} ${in}' % (
-                                       protoc, protobuf_incs, self.build_dir),
+                                   '%s ${protocflags} ${protoccpppluginflags} ${in}' % (
+                                       protoc, protobuf_incs, self._cpp_out_arg),
                            description='PROTOC ${in}')
         self.generate_rule(name='protojava',
-                           command='%s --proto_path=. %s --java_out=%s/`dirname ${in}` '
+                           command='%s --proto_path=. %s %s/`dirname ${in}` '
                                    '${protocjavapluginflags} ${in}' % (
-                                       protoc_java, protobuf_java_incs, self.build_dir),
+                                       protoc_java, protobuf_java_incs, self._java_out_prefix),
                            description='PROTOCJAVA ${in}')
         self.generate_rule(name='protopython',
                            command='%s --proto_path=. %s -I=`dirname ${in}` '
-                                   '--python_out=%s ${protocpythonpluginflags} ${in}' % (
-                                       protoc, protobuf_incs, self.build_dir),
+                                   '%s ${protocpythonpluginflags} ${in}' % (
+                                       protoc, protobuf_incs, self._python_out_arg),
                            description='PROTOCPYTHON ${in}')
         self.generate_rule(name='protodescriptors',
                            command='%s --proto_path=. %s -I=`dirname ${first}` '
@@ -320,9 +473,9 @@ class _NinjaFileHeaderGenerator(object):
                            description='PROTODESCRIPTORS ${in}')
         protoc_go_plugin = proto_config['protoc_go_plugin']
         if protoc_go_plugin:
-            go_home = config.get_item('go_config', 'go_home')
-            go_module_enabled = config.get_item('go_config', 'go_module_enabled')
-            go_module_relpath = config.get_item('go_config', 'go_module_relpath')
+            go_home = self._go_config['go_home']
+            go_module_enabled = self._go_config['go_module_enabled']
+            go_module_relpath = self._go_config['go_module_relpath']
             if not go_home:
                 console.fatal('"go_config.go_home" is not configured')
             if go_module_enabled and not go_module_relpath:
@@ -340,11 +493,13 @@ class _NinjaFileHeaderGenerator(object):
                                            protoc, protobuf_incs, protoc_go_plugin, go_out),
                                description='PROTOCGOLANG ${in}')
 
+    def generate_builtin_rules(self):
+        for name, builder, description, suffix in self._BUILTIN_RULES:
+            self.generate_rule(name=name,
+                               command=self._builtin_command(builder, suffix=suffix),
+                               description=description)
+
     def generate_resource_rules(self):
-        args = '${name} ${path} ${out} ${in}'
-        self.generate_rule(name='resource_index',
-                           command=self._builtin_command('resource_index', suffix=args),
-                           description='RESOURCE INDEX ${out}')
         self.generate_rule(name='resource',
                            command='xxd -i ${in} | '
                                    'sed -e "s/^unsigned char /const char RESOURCE_/g" '
@@ -358,7 +513,7 @@ class _NinjaFileHeaderGenerator(object):
         return cmd
 
     def get_jacocoagent(self):
-        jacoco_home = config.get_item('java_test_config', 'jacoco_home')
+        jacoco_home = self._java_test_config['jacoco_home']
         if jacoco_home:
             return os.path.join(jacoco_home, 'lib', 'jacocoagent.jar')
         return ''
@@ -381,11 +536,7 @@ class _NinjaFileHeaderGenerator(object):
             '${javacflags}',
             '${in}',
         ]
-        self._add_rule(textwrap.dedent('''\
-                source_encoding = UTF-8
-                classpath = .
-                javacflags =
-                '''))
+        self._add_rule(_JAVAC_DEFAULTS_TPL)
         self.generate_rule(name='javac',
                            command='rm -fr ${classes_dir} && mkdir -p ${classes_dir} && '
                                    '%s && sleep 0.01 && '
@@ -393,11 +544,6 @@ class _NinjaFileHeaderGenerator(object):
                                        ' '.join(cmd), jar),
                            description='JAVAC ${out}')
 
-    def generate_java_resource_rules(self):
-        self.generate_rule(name='javaresource',
-                           command=self._builtin_command('java_resource'),
-                           description='JAVA RESOURCE ${in}')
-
     def generate_java_test_rules(self):
         jacocoagent = self.get_jacocoagent()
         args = ('--script=${out} --main_class=${mainclass} --jacocoagent=%s '
@@ -407,24 +553,19 @@ class _NinjaFileHeaderGenerator(object):
                            description='JAVA TEST ${out}')
 
     def generate_java_binary_rules(self):
-        bootjar = config.get_item('java_binary_config', 'one_jar_boot_jar')
+        bootjar = self._java_binary_config['one_jar_boot_jar']
         args = '--onejar=${out} --bootjar=%s --main_class=${mainclass} ${in}' % bootjar
         self.generate_rule(name='onejar',
                            command=self._builtin_command('java_onejar', suffix=args),
                            description='ONE JAR ${out}')
-        self.generate_rule(name='javabinary',
-                           command=self._builtin_command('java_binary'),
-                           description='JAVA BIN ${out}')
 
     def generate_scalac_rule(self, java_config):
         scalac = 'scalac'
-        scala_home = config.get_item('scala_config', 'scala_home')
+        scala_home = self._scala_config['scala_home']
         if scala_home:
             scalac = os.path.join(scala_home, 'bin', scalac)
         java = self.get_java_command(java_config, 'java')
-        self._add_rule(textwrap.dedent('''\
-                scalacflags = -nowarn
-                '''))
+        self._add_rule(_SCALAC_DEFAULTS_TPL)
         cmd = [
             'JAVACMD=%s' % java,
             scalac,
@@ -441,7 +582,7 @@ class _NinjaFileHeaderGenerator(object):
     def generate_scalatest_rule(self, java_config):
         java = self.get_java_command(java_config, 'java')
         scala = 'scala'
-        scala_home = config.get_item('scala_config', 'scala_home')
+        scala_home = self._scala_config['scala_home']
         if scala_home:
             scala = os.path.join(scala_home, 'bin', scala)
         jacocoagent = self.get_jacocoagent()
@@ -452,24 +593,20 @@ class _NinjaFileHeaderGenerator(object):
                            description='SCALA TEST ${out}')
 
     def generate_java_scala_rules(self):
-        java_config = config.get_section('java_config')
+        java_config = self._java_config
         self.generate_javac_rules(java_config)
-        self.generate_java_resource_rules()
         jar = self.get_java_command(java_config, 'jar')
         args = '%s ${out} ${in}' % jar
         self.generate_rule(name='javajar',
                            command=self._builtin_command('java_jar', suffix=args),
                            description='JAVA JAR ${out}')
         self.generate_java_test_rules()
-        self.generate_rule(name='fatjar',
-                           command=self._builtin_command('java_fatjar'),
-                           description='FAT JAR ${out}')
         self.generate_java_binary_rules()
         self.generate_scalac_rule(java_config)
         self.generate_scalatest_rule(java_config)
 
     def generate_thrift_rules(self):
-        thrift_config = config.get_section('thrift_config')
+        thrift_config = self._thrift_config
         incs = _incs_list_to_string(thrift_config['thrift_incs'])
         gen_params = thrift_config['thrift_gen_params']
         thrift = thrift_config['thrift']
@@ -483,28 +620,14 @@ class _NinjaFileHeaderGenerator(object):
                                        thrift, gen_params, incs, self.build_dir),
                            description='THRIFT ${in}')
 
-    def generate_python_rules(self):
-        args = '--basedir=${basedir} --pylib=${out} ${in}'
-        self.generate_rule(name='pythonlibrary',
-                           command=self._builtin_command('python_library', suffix=args),
-                           description='PYTHON LIBRARY ${out}')
-        args = ('--basedir=${basedir} --exclusions=${exclusions} --mainentry=${mainentry} '
-                '--pybin=${out} ${in}')
-        self.generate_rule(name='pythonbinary',
-                           command=self._builtin_command('python_binary', suffix=args),
-                           description='PYTHON BINARY ${out}')
-
     def generate_go_rules(self):
-        go_home = config.get_item('go_config', 'go_home')
-        go = config.get_item('go_config', 'go')
-        go_module_enabled = config.get_item('go_config', 'go_module_enabled')
-        go_module_relpath = config.get_item('go_config', 'go_module_relpath')
+        go_home = self._go_config['go_home']
+        go = self._go_config['go']
+        go_module_enabled = self._go_config['go_module_enabled']
+        go_module_relpath = self._go_config['go_module_relpath']
         if go_home and go:
             go_pool = 'golang_pool'
-            self._add_rule(textwrap.dedent('''\
-                    pool %s
-                      depth = 1
-                    ''') % go_pool)
+            self._add_rule(_GO_POOL_TPL % go_pool)
             go_path = os.path.normpath(os.path.abspath(go_home))
             out_relative = ""
             if go_module_enabled:
@@ -532,15 +655,6 @@ class _NinjaFileHeaderGenerator(object):
                                description='GO TEST ${package}',
                                pool=go_pool)
 
-    def generate_shell_rules(self):
-        self.generate_rule(name='shelltest',
-                           command=self._builtin_command('shell_test'),
-                           description='SHELL TEST ${out}')
-        args = '${out} ${in} ${testdata}'
-        self.generate_rule(name='shelltestdata',
-                           command=self._builtin_command('shell_testdata', suffix=args),
-                           description='SHELL TEST DATA ${out}')
-
     def generate_lex_yacc_rules(self):
         self.generate_rule(name='lex',
                            command='flex ${lexflags} -o ${out} ${in}',
@@ -550,10 +664,6 @@ class _NinjaFileHeaderGenerator(object):
                            description='YACC ${in}')
 
     def generate_package_rules(self):
-        args = '${out} ${in} ${entries}'
-        self.generate_rule(name='package',
-                           command=self._builtin_command('package', suffix=args),
-                           description='PACKAGE ${out}')
         self.generate_rule(name='package_tar',
                            command='tar -c -f ${out} ${tarflags} -C ${packageroot} ${entries}',
                            description='TAR ${out}')
@@ -563,55 +673,41 @@ class _NinjaFileHeaderGenerator(object):
                            description='ZIP ${out}')
 
     def generate_version_rules(self):
-        cc = self.build_toolchain.get_cc()
-        cc_version = self.build_toolchain.get_cc_version()
-
         revision, url = blade_util.load_scm(self.build_dir)
         args = '--scm=${out} --revision=${revision} --url=${url} --profile=${profile} --compiler="${compiler}"'
         self.generate_rule(name='scm',
                            command=self._builtin_command('scm', suffix=args),
                            description='SCM ${out}')
-        scm = os.path.join(self.build_dir, 'scm.cc')
-        self._add_rule(textwrap.dedent('''\
-                build %s: scm
-                  revision = %s
-                  url = %s
-                  profile = %s
-                  compiler = %s
-                ''') % (scm, revision, url, self.options.profile, '%s %s' % (cc, cc_version)))
-        self._add_rule(textwrap.dedent('''\
-                build %s: cxx %s
-                  cppflags = -w -O2
-                  cxx_warnings =
-                ''') % (scm + '.o', scm))
+        scm = self._scm_path
+        self._add_rule(_SCM_BUILD_TPL % (
+            scm, revision, url, self.options.profile, self._compiler))
+        self._add_rule(_SCM_CXX_TPL % (scm + '.o', scm))
 
     def _builtin_command(self, builder, prefix='', suffix=''):
-        cmd = ['PYTHONPATH=%s:$$PYTHONPATH' % self.blade_path]
+        suffix = suffix or '${out} ${in}'
         if prefix:
-            cmd.append(prefix)
-        cmd.append('%s -m blade.builtin_tools %s' % (sys.executable, builder))
-        if suffix:
-            cmd.append(suffix)
-        else:
-            cmd.append('${out} ${in}')
-        return ' '.join(cmd)
+            return '%s %s %s %s %s' % (self._builtin_env, prefix, self._builtin_tool, builder, suffix)
+        return '%s %s %s' % (self._builtin_prefix, builder, suffix)
+
+    def generate(self, write):
+        """Generate ninja rules.
 
-    def generate(self):
-        """Generate ninja rules. """
+        Args:
+            write: callable to write the generated rules to, such as `file.write`.
+        """
+        self._write = write
         self.generate_file_header()
         self.generate_common_rules()
+        self.generate_builtin_rules()
         self.generate_cc_rules()
         self.generate_proto_rules()
         self.generate_resource_rules()
         self.generate_java_scala_rules()
         self.generate_thrift_rules()
-        self.generate_python_rules()
         self.generate_go_rules()
-        self.generate_shell_rules()
         self.generate_lex_yacc_rules()
         self.generate_package_rules()
         self.generate_version_rules()
-        return self.rules_buf
 
 
 class NinjaFileGenerator(object):
@@ -628,23 +724,25 @@ class NinjaFileGenerator(object):
     def get_all_rule_names(self):
         return self.__all_rule_names
 
-    def generate_build_rules(self):
-        """Generate ninja rules to build.ninja. """
+    def generate_build_rules(self, write):
+        """Generate ninja rules and write them by the `write` callable. """
         ninja_script_header_generator = _NinjaFileHeaderGenerator(
             self.blade.get_options(),
             self.build_dir,
             self.blade_path,
             self.build_toolchain,
             self.blade)
-        rules = ninja_script_header_generator.generate()
-        rules += self.blade.gen_targets_rules()
+        ninja_script_header_generator.generate(write)
         self.__all_rule_names = ninja_script_header_generator.get_all_rule_names()
-        return rules
+        for rule in self.blade.gen_targets_rules():
+            write(rule)
+            write('\n')
 
     def generate_build_script(self):
         """Generate build script for underlying build system. """
-        rules = self.generate_build_rules()
-        script = open(self.script_path, 'w')
-        script.writelines(rules)
-        script.close()
-        return rules
+        # Write into a temporary file and replace the script only after all rules are generated,
+        # otherwise a failure during generating will leave a broken build script.
+        tmp_path = self.script_path + '.tmp'
+        with open(tmp_path, 'w', buffering=1 << 20) as script:
+            self.generate_build_rules(script.write)
+        os.rename(tmp_path, self.script_path)
@@ -163,10 +163,9 @@ class Blade(object):
         maven_cache.download_all()
 
         generator = NinjaFileGenerator(self.__build_script, self.__blade_path, self)
-        rules = generator.generate_build_script()
+        generator.generate_build_script()
         self.__all_rule_names = generator.get_all_rule_names()
         console.info('Generating done.')
-        return rules
 
     def generate(self):
         """Generate the build script. """
@@ -175,6 +174,9 @@ class Blade(object):
 
     def verify(self):
         """Verify specific targets after build is complete. """
+        if not config.get_item('cc_config', 'check_inclusion'):
+            # No inclusion information is generated
+            return True
         verify_history = self._load_verify_history()
         header_inclusion_history = verify_history['header_inclusion_dependencies']
         error = 0
@@ -523,7 +525,7 @@ class Blade(object):
             target_ninja = self._find_or_generate_target_ninja_file(target)
             if target_ninja:
                 target._remove_on_clean(target_ninja)
-                rules_buf += 'include %s\n' % target_ninja
+                rules_buf.append('include %s' % target_ninja)
 
         return rules_buf
 
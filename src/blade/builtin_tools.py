@@ -163,6 +163,34 @@ def generate_securecc_object(args):
             shutil.copy(phony_obj, obj)
 
 
+def split_gcc_h(args):
+    """Split the inclusion stack generated by gcc's `-H` option from the diagnostic messages.
+
+    Read the mixed messages from stdin, write the inclusion stack lines to stdout and other
+    messages to stderr, just like the awk script in the backend, which is used when awk is
+    installed. The useless `Multiple ...` is the last part of the messages and is dropped.
+    """
+    # Use binary streams to pass through the messages as is
+    stdin = getattr(sys.stdin, 'buffer', sys.stdin)
+    stdout = getattr(sys.stdout, 'buffer', sys.stdout)
+    stderr = getattr(sys.stderr, 'buffer', sys.stderr)
+    stop = False
+    # Always consume all the input to avoid breaking the pipe of the compiler
+    for line in stdin:
+        if stop:
+            continue
+        if line.startswith(b'Multiple include guards may be useful for:'):
+            stop = True
+            continue
+        fields = line.split(None, 1)
+        if fields and not fields[0].strip(b'.'):
+            stdout.write(line)
+        else:
+            stderr.write(line)
+    stdout.flush()
+    stderr.flush()
+
+
 def _generate_resource_index(targets, sources, name, path):
     """Generate resource index description file for a cc resource library"""
     header, source = targets
@@ -544,6 +572,7 @@ _BUILTIN_TOOLS = {
     'scm': generate_scm,
     'package': generate_package,
     'securecc_object': generate_securecc_object,
+    'split_gcc_h': split_gcc_h,
     'resource_index': generate_resource_index,
     'java_jar': generate_java_jar,
     'java_resource': generate_java_resource,
@@ -93,6 +93,9 @@ class BladeConfig(object):
                     'mid': ['-g'],
                     'high': ['-g3'],
                 },
+                'check_inclusion': True,
+                'check_inclusion__doc__': 'Whether generate the header inclusion information with '
+                    'the `-H` option during compiling to verify the missing dependencies of headers',
                 'hdr_dep_missing_severity': 'warning',
                 'hdr_dep_missing_severity__doc__': 'The severity of the missing dependency on the '
                     'library to which the header file belongs, can be "info", "warning", "error"',
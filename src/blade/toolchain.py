@@ -15,9 +15,10 @@ from __future__ import print_function
 import os
 import subprocess
 import tempfile
+import threading
 
 from blade import console
-from blade.blade_util import var_to_list, iteritems, to_string
+from blade.blade_util import cpu_count, var_to_list, iteritems, to_string
 
 
 class BuildArchitecture(object):
@@ -263,23 +264,75 @@ class ToolChain(object):
 
     def filter_cc_flags(self, flag_list, language='c'):
         """Filter out the unrecognized compilation flags. """
-        valid_flags, unrecognized_flags = [], []
+        return self.filter_cc_flags_batch([(flag_list, language)])[0]
+
+    def _test_cc_flags_worker(self, keys, tested, errors):
+        """Thread function of _test_cc_flags, store the exception into errors on failure."""
+        try:
+            self._test_cc_flags(keys, tested)
+        except Exception as e:  # pylint: disable=broad-except
+            errors.append(e)
+
+    def _test_cc_flags(self, keys, tested):
+        """Test whether each (flag, language) in keys is supported, store results into tested."""
         # Put compilation output into test.o instead of /dev/null
         # because the command line with '--coverage' below exit
         # with status 1 which makes '--coverage' unsupported
         # echo "int main() { return 0; }" | gcc -o /dev/null -c -x c --coverage - > /dev/null 2>&1
         fd, obj = tempfile.mkstemp('.o', 'filter_cc_flags_test')
-        for flag in var_to_list(flag_list):
-            cmd = ('echo "int main() { return 0; }" | '
-                   '%s -o %s -c -x %s -Werror %s - > /dev/null 2>&1' % (
-                       self.cc, obj, language, flag))
-            if subprocess.call(cmd, shell=True) == 0:
-                valid_flags.append(flag)
-            else:
-                unrecognized_flags.append(flag)
-        os.remove(obj)
-        os.close(fd)
-        if unrecognized_flags:
-            console.warning('config: Unrecognized %s flags: %s' % (
-                    language, ', '.join(unrecognized_flags)))
-        return valid_flags
+        try:
+            for flag, language in keys:
+                cmd = ('echo "int main() { return 0; }" | '
+                       '%s -o %s -c -x %s -Werror %s - > /dev/null 2>&1' % (
+                           self.cc, obj, language, flag))
+                tested[(flag, language)] = subprocess.call(cmd, shell=True) == 0
+        finally:
+            os.close(fd)
+            os.remove(obj)
+
+    def filter_cc_flags_batch(self, flags_with_language):
+        """Filter out the unrecognized compilation flags of several flag lists at once.
+
+        Args:
+            flags_with_language: list of (flag_list, language) pairs.
+
+        Returns:
+            A list of the valid flags for each pair, in the same order.
+        """
+        flags_with_language = [(var_to_list(flag_list), language)
+                               for flag_list, language in flags_with_language]
+        keys = []  # Unique (flag, language) to be tested
+        for flag_list, language in flags_with_language:
+            for flag in flag_list:
+                if (flag, language) not in keys:
+                    keys.append((flag, language))
+
+        # Each test runs the compiler in a subprocess, run them in several threads concurrently
+        tested = {}  # (flag, language) -> bool
+        errors = []  # Exceptions raised in the threads
+        num_threads = min(len(keys), cpu_count())
+        threads = []
+        for i in range(num_threads):
+            thread = threading.Thread(target=self._test_cc_flags_worker,
+                                      args=(keys[i::num_threads], tested, errors))
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        if errors:
+            # Otherwise the untested flags would be reported as unrecognized and dropped
+            raise errors[0]
+
+        results = []
+        for flag_list, language in flags_with_language:
+            valid_flags, unrecognized_flags = [], []
+            for flag in flag_list:
+                if tested.get((flag, language)):
+                    valid_flags.append(flag)
+                else:
+                    unrecognized_flags.append(flag)
+            if unrecognized_flags:
+                console.warning('config: Unrecognized %s flags: %s' % (
+                        language, ', '.join(unrecognized_flags)))
+            results.append(valid_flags)
+        return results
@@ -0,0 +1,64 @@
+# Copyright (c) 2026 Tencent Inc.
+# All rights reserved.
+#
+# Date:   October 15, 2026
+
+
+"""
+ This is the test module for the ninja build script generator.
+"""
+
+
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.append('..')
+from blade import backend
+from blade.build_accelerator import BuildAccelerator
+from blade.toolchain import ToolChain
+
+
+class _Options(object):
+    m = '64'
+    profile = 'release'
+    gprof = False
+    coverage = False
+
+
+class _FakeBlade(object):
+    """The part of the build manager used by the header generator. """
+    def __init__(self, build_dir, toolchain):
+        self.build_accelerator = BuildAccelerator(build_dir, toolchain)
+
+    def build_jobs_num(self):
+        return 1
+
+
+class TestNinjaFileHeaderGenerator(unittest.TestCase):
+    """Generate the build script header with the real toolchain. """
+    def setUp(self):
+        self.build_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.build_dir)
+
+    def testGenerate(self):
+        toolchain = ToolChain()
+        generator = backend._NinjaFileHeaderGenerator(
+            _Options(), self.build_dir, '..', toolchain,
+            _FakeBlade(self.build_dir, toolchain))
+        rules = []
+        generator.generate(rules.append)
+        script = ''.join(rules)
+        self.assertIn('builddir = %s\n' % self.build_dir, script)
+        self.assertIn('-pipe -fno-omit-frame-pointer', script)
+        rule_names = generator.get_all_rule_names()
+        for name in ('cc', 'cxx', 'link', 'proto', 'javac', 'scm'):
+            self.assertIn(name, rule_names)
+            self.assertIn('rule %s\n' % name, script)
+
+
+if __name__ == '__main__':
+    unittest.main()
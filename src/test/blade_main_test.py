@@ -16,6 +16,7 @@ import sys
 import unittest
 
 sys.path.append('..')
+from backend_test import TestNinjaFileHeaderGenerator
 from cc_binary_test import TestCcBinary
 from cc_library_test import TestCcLibrary
 from cc_plugin_test import TestCcPlugin
@@ -53,7 +54,8 @@ def _main():
         unittest.defaultTestLoader.loadTestsFromTestCase(TestDepsAnalyzing),
         unittest.defaultTestLoader.loadTestsFromTestCase(TestQuery),
         unittest.defaultTestLoader.loadTestsFromTestCase(TestTestRunner),
-        unittest.defaultTestLoader.loadTestsFromTestCase(TestPrebuildCcLibrary)
+        unittest.defaultTestLoader.loadTestsFromTestCase(TestPrebuildCcLibrary),
+        unittest.defaultTestLoader.loadTestsFromTestCase(TestNinjaFileHeaderGenerator),
         ])
 
     generate_html = len(sys.argv) > 1 and sys.argv[1].startswith('html')